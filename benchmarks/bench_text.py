@@ -0,0 +1,67 @@
+#!/usr/bin/python
+"""
+Benchmark the entry text pipeline
+
+Run from the top of the source tree:
+
+  python benchmarks/bench_text.py [ENTRIES]
+
+This compares the old behaviour (no conversion at all) with the text
+pipeline on an empty cache, an in-memory cache and a cache loaded from
+disk, for a synthetic archive.
+"""
+
+from diaro_render.text import TextRenderer
+from tempfile import TemporaryDirectory
+from timeit import default_timer
+import os.path
+import sys
+
+
+PARAGRAPH = ("Went to the park & saw <lots> of ducks. Photos are at "
+             "https://example.com/ducks?day=1&sort=asc, more to follow.\n"
+             "Weather was fine.")
+
+
+class BenchEntry(object):
+    def __init__(self, text):
+        self.text = text
+
+
+def make_entries(count):
+    return [BenchEntry("Entry {}\n\n{}\n\n{}".format(n, PARAGRAPH, PARAGRAPH))
+            for n in range(count)]
+
+
+def timed(label, count, func):
+    start = default_timer()
+    func()
+    elapsed = default_timer() - start
+    print("{label:>14}: {elapsed:8.3f}s {rate:12.0f} entries/s".format(
+        label=label, elapsed=elapsed, rate=count / elapsed))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    entries = make_entries(count)
+
+    timed('unconverted', count,
+          lambda: ['<p>{}</p>'.format(entry.text) for entry in entries])
+
+    with TemporaryDirectory() as tmpdir:
+        cache_file = os.path.join(tmpdir, 'cache.json')
+        renderer = TextRenderer(cache_file=cache_file)
+        timed('cold cache', count,
+              lambda: list(renderer.render_entries(entries)))
+        timed('memory cache', count,
+              lambda: list(renderer.render_entries(entries)))
+        renderer.save()
+
+        def warm():
+            list(TextRenderer(cache_file=cache_file).render_entries(entries))
+
+        timed('disk cache', count, warm)
+
+
+if __name__ == '__main__':
+    main()
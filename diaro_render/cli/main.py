@@ -23,8 +23,22 @@ Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 from __future__ import absolute_import
 from argparse import ArgumentParser
 from diaro_render.data import Diaro
+from diaro_render.output import (Checkpoint, Progress, partition,
+                                 partition_digest, partition_filename,
+                                 write_atomic, DEFAULT_PARTITION_SIZE)
+from diaro_render.text import TextRenderer, TEXT_PIPELINE_VERSION
 from datetime import datetime, timedelta
-import os.path
+from html import escape
+import locale
+import logging
+import os
+import sys
+import time
+
+
+# Minimum number of seconds between saves of the text cache while
+# writing partitions. It is always saved when rendering stops.
+TEXT_CACHE_SAVE_INTERVAL = 60
 
 
 class CLI(object):
@@ -42,7 +56,23 @@ class CLI(object):
         parser.add_argument('--summary', action='store_true',
                             help='show summary instead of HTML output')
         parser.add_argument('--only-year', help='only render entries from year')
+        parser.add_argument('--text-cache', metavar='FILE',
+                            help='file to cache converted entry text in '
+                            'between runs')
+        parser.add_argument('--output', metavar='DIR',
+                            help='write HTML in partitions to DIR instead '
+                            'of standard output')
+        parser.add_argument('--partition-size', metavar='N', type=int,
+                            default=DEFAULT_PARTITION_SIZE,
+                            help='number of entries per output partition')
+        parser.add_argument('--resume', action='store_true',
+                            help='skip partitions already written to the '
+                            'output directory')
         self.namespace = parser.parse_args(args=args)
+        if self.namespace.resume and self.namespace.output is None:
+            parser.error('--resume requires --output')
+        if self.namespace.partition_size < 1:
+            parser.error('--partition-size must be at least 1')
 
     def run(self):
         diaro = Diaro(self.namespace.file[0])
@@ -73,39 +103,101 @@ class CLI(object):
             return
 
         # render HTML
+        renderer = TextRenderer(cache_file=self.namespace.text_cache)
+        renderer.prune(entry.text for entry in diaro.entries.values())
+        try:
+            if self.namespace.output is None:
+                for entry, text in renderer.render_entries(entries):
+                    print(self._render_entry(diaro, entry, text))
+            else:
+                self._render_partitions(diaro, entries, renderer)
+        finally:
+            renderer.save()
+
+    def _render_entry(self, diaro, entry, text):
         mediapath = self.namespace.mediapath
         thumbsuffix = self.namespace.thumbsuffix
-        for entry in entries:
-            dt = datetime.fromtimestamp(entry.date / 1000.0)
-            date = dt.strftime('%A %d %B %Y')
-            time = dt.strftime('%H:%M')
-            photo = ''
-            attachments = diaro.get_attachments_for_entry(entry.uid)
-            for attachment in attachments:
-                assert attachment.type == 'photo'
-                fmt = '<div><a href="{imgfullpath}"><img src="{imgthumbpath}" alt="" /></a></div>'
-                filename, ext = os.path.splitext(attachment.filename)
-                photo += fmt.format(
-                    imgfullpath=os.path.join(mediapath,
-                                             attachment.filename),
-                    imgthumbpath=os.path.join(mediapath,
-                                              filename + thumbsuffix + ext))
-
-            print("""\
+        dt = datetime.fromtimestamp(entry.date / 1000.0)
+        date = dt.strftime('%A %d %B %Y')
+        time = dt.strftime('%H:%M')
+        photo = ''
+        attachments = diaro.get_attachments_for_entry(entry.uid)
+        for attachment in attachments:
+            assert attachment.type == 'photo'
+            fmt = '<div><a href="{imgfullpath}"><img src="{imgthumbpath}" alt="" /></a></div>'
+            filename, ext = os.path.splitext(attachment.filename)
+            photo += fmt.format(
+                imgfullpath=os.path.join(mediapath,
+                                         attachment.filename),
+                imgthumbpath=os.path.join(mediapath,
+                                          filename + thumbsuffix + ext))
+
+        return """\
 <div>
   <!-- entry -->
   <h3>{title}</h3>
   <small><b>{date}</b> <i>{time}</i> ({foldertitle})</small>
-  <p>{text}</p>
+  {text}
   {photo}
 </div>
 """.format(date=date, time=time,
-           foldertitle=diaro.folders[entry.folder_uid].title,
-           title=entry.title,
-           text=entry.text,
-           photo=photo))
+           foldertitle=escape(diaro.folders[entry.folder_uid].title),
+           title=escape(entry.title),
+           text=text,
+           photo=photo)
+
+    def _render_partitions(self, diaro, entries, renderer):
+        """
+        Write entries to numbered files in the output directory,
+        recording each completed file so that --resume can skip it.
+        """
+
+        directory = self.namespace.output
+        os.makedirs(directory, exist_ok=True)
+        checkpoint = Checkpoint(directory, settings={
+            'mediapath': self.namespace.mediapath,
+            'thumbsuffix': self.namespace.thumbsuffix,
+            'input': os.path.abspath(self.namespace.file[0]),
+            'text_pipeline_version': TEXT_PIPELINE_VERSION,
+            # Used by datetime.fromtimestamp() and strftime()
+            'timezone': [time.timezone, time.altzone, list(time.tzname)],
+            'lc_time': locale.setlocale(locale.LC_TIME),
+        })
+        if self.namespace.resume:
+            checkpoint.load()
+
+        partitions = partition(entries, self.namespace.partition_size)
+        progress = Progress(len(entries))
+        last_save = time.monotonic()
+        for index, part in enumerate(partitions):
+            filename = partition_filename(index)
+            digest = partition_digest(diaro, part)
+            if checkpoint.is_done(filename, digest):
+                progress.skip(len(part))
+                print("{filename}: already written".format(filename=filename),
+                      file=sys.stderr)
+                continue
+
+            html = ''.join(self._render_entry(diaro, entry, text) + '\n'
+                           for entry, text in renderer.render_entries(part))
+            write_atomic(os.path.join(directory, filename), html)
+            checkpoint.mark_done(filename, digest)
+            if time.monotonic() - last_save >= TEXT_CACHE_SAVE_INTERVAL:
+                renderer.save()
+                last_save = time.monotonic()
+
+            progress.update(len(part))
+            print("{filename}: {progress}".format(filename=filename,
+                                                 progress=progress),
+                  file=sys.stderr)
+
+        for filename in checkpoint.prune(len(partitions)):
+            print("{filename}: removed stale partition".format(
+                filename=filename), file=sys.stderr)
+
 
 def main():
+    logging.basicConfig(format='%(levelname)s: %(message)s')
     CLI().run()
 
 
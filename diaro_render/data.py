@@ -60,6 +60,14 @@ class Diaro(object):
         root = ET.parse(filename).getroot()
         self._parse_root(root)
 
+        # entry uid -> [DiaroAttachment], in position order
+        self._entry_attachments = {}
+        for attachment in self.attachments.values():
+            self._entry_attachments.setdefault(attachment.entry_uid,
+                                               []).append(attachment)
+        for attachments in self._entry_attachments.values():
+            attachments.sort(key=lambda x: x.position)
+
     def get_entries_for_folders(self, folder_uids=None):
         """
         Return entries in a given folders, in date order.
@@ -76,10 +84,7 @@ class Diaro(object):
         Return attachments for a given entry in position order.
         """
 
-        attachments = [attachment for attachment in self.attachments.values()
-                       if attachment.entry_uid == entry_uid]
-        attachments.sort(key=lambda x: x.position)
-        return attachments
+        return list(self._entry_attachments.get(entry_uid, []))
 
     def _gather_properties(self, node, properties):
         props = {}
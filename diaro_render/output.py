@@ -0,0 +1,234 @@
+"""
+Write rendered output in resumable partitions
+
+Copyright (C) 2017, 2019
+Authors:
+  Tim Waugh <tim@cyberelk.net>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+
+from datetime import timedelta
+from tempfile import NamedTemporaryFile
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+
+
+CHECKPOINT_VERSION = 2
+CHECKPOINT_FILENAME = 'checkpoint.json'
+DEFAULT_PARTITION_SIZE = 500
+PARTITION_FILENAME = 'entries-{:05d}.html'
+PARTITION_FILENAME_RE = re.compile(r'^entries-(\d{5,})\.html$')
+
+
+def write_atomic(filename, data):
+    """
+    Write data to filename via a temporary file and rename, so that
+    filename is either absent, unchanged, or complete.
+    """
+
+    directory, basename = os.path.split(os.path.abspath(filename))
+    fp = NamedTemporaryFile(mode='w', encoding='utf-8', dir=directory,
+                            prefix=basename + '.', suffix='.tmp',
+                            delete=False)
+    try:
+        with fp:
+            fp.write(data)
+            fp.flush()
+            os.fsync(fp.fileno())
+
+        # NamedTemporaryFile creates the file readable only by us
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(fp.name, 0o666 & ~umask)
+        os.replace(fp.name, filename)
+    except BaseException:
+        os.unlink(fp.name)
+        raise
+
+
+def partition_filename(index):
+    return PARTITION_FILENAME.format(index)
+
+
+def partition(entries, size):
+    """
+    Split entries into lists of at most size entries.
+    """
+
+    return [entries[start:start + size]
+            for start in range(0, len(entries), size)]
+
+
+def partition_digest(diaro, entries):
+    """
+    Return a digest of everything the HTML for a partition depends on.
+    """
+
+    digest = hashlib.sha1()
+    for entry in entries:
+        attachments = diaro.get_attachments_for_entry(entry.uid)
+        fields = [entry.uid, str(entry.date), entry.title, entry.text,
+                  diaro.folders[entry.folder_uid].title]
+        fields += [attachment.type + ':' + attachment.filename
+                   for attachment in attachments]
+        for field in fields:
+            digest.update(field.encode('utf-8'))
+            digest.update(b'\0')
+
+        digest.update(b'\1')
+
+    return digest.hexdigest()
+
+
+class Checkpoint(object):
+    """
+    Record of the partitions already written to an output directory.
+
+    Each completed partition is stored with a digest of its entries,
+    so a partition is only considered done if the same content would be
+    written to it again. The settings the output depends on are stored
+    too; if they change, all recorded partitions are discarded.
+    """
+
+    def __init__(self, directory, settings=None):
+        self.directory = directory
+        self.filename = os.path.join(directory, CHECKPOINT_FILENAME)
+        self.settings = settings or {}
+        self.partitions = {}  # filename -> digest
+
+    def load(self):
+        try:
+            with open(self.filename, encoding='utf-8') as fp:
+                data = json.load(fp)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as exc:
+            logging.warning("ignoring checkpoint %s: %s", self.filename, exc)
+            return
+
+        if (not isinstance(data, dict) or
+                not isinstance(data.get('partitions', {}), dict)):
+            logging.warning("ignoring checkpoint %s: unexpected format",
+                            self.filename)
+            return
+
+        if (data.get('version') != CHECKPOINT_VERSION or
+                data.get('settings') != self.settings):
+            logging.warning("checkpoint %s does not match, starting over",
+                            self.filename)
+            return
+
+        self.partitions = data.get('partitions', {})
+
+    def is_done(self, filename, digest):
+        return (self.partitions.get(filename) == digest and
+                os.path.exists(os.path.join(self.directory, filename)))
+
+    def mark_done(self, filename, digest):
+        self.partitions[filename] = digest
+        self._save()
+
+    def prune(self, count):
+        """
+        Remove partition files, and their records, numbered count or
+        above, left over from an earlier run with more entries. Return
+        the names of the files removed.
+        """
+
+        stale = set()
+        for name in list(self.partitions) + os.listdir(self.directory):
+            match = PARTITION_FILENAME_RE.match(name)
+            if match and int(match.group(1)) >= count:
+                stale.add(name)
+
+        removed = []
+        for name in sorted(stale):
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+
+            removed.append(name)
+
+        if stale.intersection(self.partitions):
+            for name in stale:
+                self.partitions.pop(name, None)
+
+            self._save()
+
+        return removed
+
+    def _save(self):
+        write_atomic(self.filename, json.dumps({
+            'version': CHECKPOINT_VERSION,
+            'settings': self.settings,
+            'partitions': self.partitions,
+        }))
+
+
+class Progress(object):
+    """
+    Track rendering rate and estimate the time remaining.
+
+    Entries skipped because they were already written count towards
+    completion but not towards the rate, and neither does the time
+    spent deciding to skip them.
+    """
+
+    def __init__(self, total, clock=time.monotonic):
+        self.total = total
+        self.clock = clock
+        self.start = self.last = clock()
+        self.skipped_time = 0.0
+        self.done = 0
+        self.rendered = 0
+
+    def skip(self, count):
+        now = self.clock()
+        self.skipped_time += now - self.last
+        self.last = now
+        self.done += count
+
+    def update(self, count):
+        self.last = self.clock()
+        self.done += count
+        self.rendered += count
+
+    @property
+    def rate(self):
+        elapsed = self.clock() - self.start - self.skipped_time
+        if elapsed <= 0:
+            return 0.0
+
+        return self.rendered / elapsed
+
+    @property
+    def eta(self):
+        rate = self.rate
+        if not rate:
+            return None
+
+        return timedelta(seconds=round((self.total - self.done) / rate))
+
+    def __str__(self):
+        eta = self.eta
+        return "{done}/{total} entries, {rate:.1f} entries/s, ETA {eta}".format(
+            done=self.done, total=self.total, rate=self.rate,
+            eta='unknown' if eta is None else eta)
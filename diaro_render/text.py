@@ -0,0 +1,177 @@
+"""
+Convert Diaro entry text into HTML
+
+Copyright (C) 2017, 2019
+Authors:
+  Tim Waugh <tim@cyberelk.net>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+
+from diaro_render.output import write_atomic
+from html import escape
+import hashlib
+import json
+import logging
+import re
+
+
+# Bump this whenever the output of TextRenderer.convert() changes, so
+# that stale results in a persistent cache are not reused.
+TEXT_PIPELINE_VERSION = 1
+
+PARAGRAPH_SPLIT = re.compile(r'\n\s*\n')
+URL = re.compile(r'\b(?:https?://|www\.)[^\s<>"]+[^\s<>".,;:!?)\]\'}]',
+                 re.IGNORECASE)
+
+
+def text_hash(text):
+    """
+    Return the cache key for a piece of entry text.
+    """
+
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def _convert_line(line):
+    """
+    Escape a line of text, turning any URLs in it into links.
+    """
+
+    html = ''
+    pos = 0
+    for match in URL.finditer(line):
+        url = match.group(0)
+        href = url
+        if not url.lower().startswith('http'):
+            href = 'http://' + url
+
+        html += escape(line[pos:match.start()])
+        html += '<a href="{href}">{url}</a>'.format(href=escape(href),
+                                                    url=escape(url))
+        pos = match.end()
+
+    return html + escape(line[pos:])
+
+
+class TextRenderer(object):
+    """
+    Turn plain entry text into HTML paragraphs.
+
+    Text is escaped, blank lines separate paragraphs, single newlines
+    become <br />, and URLs are turned into links. Results are memoized
+    by text hash and, if cache_file is given, persisted between runs.
+    """
+
+    def __init__(self, cache_file=None):
+        self.cache_file = cache_file
+        self.cache = {}  # text hash -> HTML
+        self.dirty = False
+        if cache_file is not None:
+            self._load()
+
+    @staticmethod
+    def convert(text):
+        """
+        Convert a single piece of text, without using the cache.
+        """
+
+        text = text.replace('\r\n', '\n').replace('\r', '\n').strip()
+        if not text:
+            return ''
+
+        paragraphs = []
+        for paragraph in PARAGRAPH_SPLIT.split(text):
+            lines = [_convert_line(line.strip())
+                     for line in paragraph.split('\n')]
+            paragraphs.append('<p>{}</p>'.format('<br />\n'.join(lines)))
+
+        return '\n'.join(paragraphs)
+
+    def render(self, text):
+        """
+        Return the HTML for text, using the cache where possible.
+        """
+
+        key = text_hash(text)
+        if key not in self.cache:
+            self.cache[key] = self.convert(text)
+            self.dirty = True
+
+        return self.cache[key]
+
+    def render_entries(self, entries):
+        """
+        Yield (entry, HTML) for each entry.
+        """
+
+        for entry in entries:
+            yield entry, self.render(entry.text)
+
+    def prune(self, texts):
+        """
+        Drop cached results for anything not in texts, such as the old
+        text of entries that have since been edited.
+        """
+
+        keep = set(text_hash(text) for text in texts)
+        stale = [key for key in self.cache if key not in keep]
+        for key in stale:
+            del self.cache[key]
+
+        if stale:
+            self.dirty = True
+
+    def _load(self):
+        try:
+            with open(self.cache_file, encoding='utf-8') as fp:
+                data = json.load(fp)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as exc:
+            logging.warning("ignoring text cache %s: %s",
+                            self.cache_file, exc)
+            return
+
+        if (not isinstance(data, dict) or
+                not isinstance(data.get('entries', {}), dict)):
+            logging.warning("ignoring text cache %s: unexpected format",
+                            self.cache_file)
+            return
+
+        if data.get('version') != TEXT_PIPELINE_VERSION:
+            logging.info("text cache %s is out of date", self.cache_file)
+            return
+
+        entries = data.get('entries', {})
+        self.cache.update((key, html) for key, html in entries.items()
+                          if isinstance(key, str) and isinstance(html, str))
+        if len(self.cache) != len(entries):
+            logging.warning("ignoring %d malformed entries in text cache %s",
+                            len(entries) - len(self.cache), self.cache_file)
+
+    def save(self):
+        """
+        Write the cache back to cache_file, if anything changed.
+        """
+
+        if self.cache_file is None or not self.dirty:
+            return
+
+        write_atomic(self.cache_file, json.dumps({
+            'version': TEXT_PIPELINE_VERSION,
+            'entries': self.cache,
+        }))
+        self.dirty = False
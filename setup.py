@@ -10,6 +10,7 @@ setup(
     author_email='tim@cyberelk.net',
     packages=find_packages(exclude=["*.tests", "*.tests.*", "tests.*", "tests"]),
     license="GPLv2",
+    python_requires='>=3.6',
     entry_points={
           'console_scripts': ['diaro-render=diaro_render.cli.main:main'],
     },
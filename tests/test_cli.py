@@ -23,6 +23,46 @@ Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 from diaro_render.cli.main import CLI
 from textwrap import dedent
 from tempfile import NamedTemporaryFile
+import json
+import os
+import pytest
+import subprocess
+import sys
+
+
+def entries_xml(texts):
+    """
+    Return Diaro XML with one entry in folder '2' for each of texts.
+    """
+
+    xml = '<data version="2">\n'
+    xml += dedent("""\
+        <table name="diaro_folders">
+        <r>
+           <uid>2</uid>
+           <title>Diary entries</title>
+           <color>#000000</color>
+           <pattern>pattern01</pattern>
+        </r>
+        </table>
+        <table name="diaro_entries">
+        """)
+    for uid, text in enumerate(texts):
+        xml += dedent("""\
+            <r>
+               <uid>{uid}</uid>
+               <date>143499705200{uid}</date>
+               <tz_offset>+01:00</tz_offset>
+               <title>title{uid}</title>
+               <text>{text}</text>
+               <folder_uid>2</folder_uid>
+               <location_uid></location_uid>
+               <tags></tags>
+               <primary_photo_uid></primary_photo_uid>
+            </r>
+            """.format(uid=uid, text=text))
+    xml += '</table>\n</data>\n'
+    return xml
 
 
 class TestDiaroCLI(object):
@@ -37,3 +77,173 @@ class TestDiaroCLI(object):
             fp.flush()
             cli = CLI([fp.name])
             cli.run()
+
+    def test_render_text(self, capsys, tmpdir):
+        xml = dedent("""\
+            <data version="2">
+            <table name="diaro_folders">
+            <r>
+               <uid>2</uid>
+               <title>Diary &amp; notes</title>
+               <color>#000000</color>
+               <pattern>pattern01</pattern>
+            </r>
+            </table>
+            <table name="diaro_entries">
+            <r>
+               <uid>1</uid>
+               <date>1434997052007</date>
+               <tz_offset>+01:00</tz_offset>
+               <title>a &lt; b</title>
+               <text>one &amp; two
+
+            three</text>
+               <folder_uid>2</folder_uid>
+               <location_uid>3</location_uid>
+               <tags></tags>
+               <primary_photo_uid></primary_photo_uid>
+            </r>
+            </table>
+            </data>
+            """)
+
+        cache_file = tmpdir.join('cache.json')
+        with NamedTemporaryFile(mode='w') as fp:
+            fp.write(xml)
+            fp.flush()
+            cli = CLI([fp.name, '--folder', '2',
+                       '--text-cache', str(cache_file)])
+            cli.run()
+
+        out, err = capsys.readouterr()
+        assert '<h3>a &lt; b</h3>' in out
+        assert '(Diary &amp; notes)' in out
+        assert '<p>one &amp; two</p>\n<p>three</p>' in out
+        assert cache_file.check()
+
+    def test_resume(self, capsys, tmpdir):
+        xml = entries_xml(['text{}'.format(uid) for uid in range(5)])
+        output = tmpdir.join('output')
+        with NamedTemporaryFile(mode='w') as fp:
+            fp.write(xml)
+            fp.flush()
+            args = [fp.name, '--folder', '2', '--output', str(output),
+                    '--partition-size', '2']
+            CLI(args).run()
+            names = sorted(path.basename for path in output.listdir())
+            assert names == ['checkpoint.json', 'entries-00000.html',
+                             'entries-00001.html', 'entries-00002.html']
+            assert '<h3>title2</h3>' in output.join('entries-00001.html').read()
+            assert '<h3>title4</h3>' in output.join('entries-00002.html').read()
+            out, err = capsys.readouterr()
+            assert out == ''
+            assert '5/5 entries' in err
+
+            # Simulate an interrupted run
+            output.join('entries-00002.html').remove()
+            output.join('entries-00000.html').write('kept')
+            CLI(args + ['--resume']).run()
+            assert output.join('entries-00000.html').read() == 'kept'
+            assert '<h3>title4</h3>' in output.join('entries-00002.html').read()
+            out, err = capsys.readouterr()
+            assert 'entries-00000.html: already written' in err
+            assert 'entries-00000.html: 2/5' not in err
+            assert 'entries-00002.html: 5/5 entries' in err
+
+            # Without --resume everything is written again
+            CLI(args).run()
+            assert output.join('entries-00000.html').read() != 'kept'
+
+    def test_resume_requires_output(self):
+        with pytest.raises(SystemExit):
+            CLI(['DiaroBackup.xml', '--resume'])
+
+    @pytest.mark.parametrize('size', ['0', '-1'])
+    def test_partition_size_invalid(self, size):
+        with pytest.raises(SystemExit):
+            CLI(['DiaroBackup.xml', '--output', 'out',
+                 '--partition-size', size])
+
+    def test_resume_changed_entry(self, capsys, tmpdir):
+        output = tmpdir.join('output')
+        xml = tmpdir.join('DiaroBackup.xml')
+        args = [str(xml), '--folder', '2', '--output', str(output),
+                '--partition-size', '2']
+
+        xml.write(entries_xml(['text0', 'text1', 'text2']))
+        CLI(args).run()
+        xml.write(entries_xml(['text0', 'changed', 'text2']))
+        capsys.readouterr()
+        CLI(args + ['--resume']).run()
+
+        assert 'changed' in output.join('entries-00000.html').read()
+        out, err = capsys.readouterr()
+        assert 'entries-00000.html: 2/3 entries' in err
+        assert 'entries-00001.html: already written' in err
+
+    def test_resume_settings_changed(self, caplog, capsys, tmpdir):
+        output = tmpdir.join('output')
+        xml = tmpdir.join('DiaroBackup.xml')
+        xml.write(entries_xml(['text0']))
+        args = [str(xml), '--folder', '2', '--output', str(output)]
+        CLI(args).run()
+
+        checkpoint = json.loads(output.join('checkpoint.json').read())
+        assert set(checkpoint['settings']) == {
+            'mediapath', 'thumbsuffix', 'input', 'text_pipeline_version',
+            'timezone', 'lc_time',
+        }
+
+        capsys.readouterr()
+        CLI(args + ['--resume', '--mediapath', 'media']).run()
+        assert 'does not match, starting over' in caplog.text
+        out, err = capsys.readouterr()
+        assert 'entries-00000.html: 1/1 entries' in err
+
+    def test_stale_partitions(self, capsys, tmpdir):
+        output = tmpdir.join('output')
+        xml = tmpdir.join('DiaroBackup.xml')
+        args = [str(xml), '--folder', '2', '--output', str(output),
+                '--partition-size', '2']
+
+        xml.write(entries_xml(['text{}'.format(uid) for uid in range(5)]))
+        CLI(args).run()
+        xml.write(entries_xml(['text0', 'text1']))
+        capsys.readouterr()
+        CLI(args + ['--resume']).run()
+        out, err = capsys.readouterr()
+        assert 'entries-00002.html: removed stale partition' in err
+
+        names = sorted(path.basename for path in output.listdir())
+        assert names == ['checkpoint.json', 'entries-00000.html']
+        checkpoint = json.loads(output.join('checkpoint.json').read())
+        assert list(checkpoint['partitions']) == ['entries-00000.html']
+
+    def test_output_non_ascii_locale(self, tmpdir):
+        output = tmpdir.join('output')
+        xml = tmpdir.join('DiaroBackup.xml')
+        xml.write_binary(entries_xml(['caf\xe9 \u2615']).encode('utf-8'))
+        env = dict(os.environ, LC_ALL='C', PYTHONCOERCECLOCALE='0')
+        env.pop('PYTHONUTF8', None)
+        subprocess.check_call([sys.executable, '-X', 'utf8=0',
+                               '-m', 'diaro_render.cli.main', str(xml),
+                               '--folder', '2', '--output', str(output)],
+                              env=env)
+        html = output.join('entries-00000.html').read_binary()
+        assert 'caf\xe9 \u2615'.encode('utf-8') in html
+
+    def test_text_cache_saved_on_interrupt(self, tmpdir, monkeypatch):
+        def interrupt(*args):
+            raise KeyboardInterrupt
+
+        output = tmpdir.join('output')
+        xml = tmpdir.join('DiaroBackup.xml')
+        xml.write(entries_xml(['text0', 'text1']))
+        cache_file = tmpdir.join('cache.json')
+        monkeypatch.setattr('diaro_render.cli.main.write_atomic', interrupt)
+        cli = CLI([str(xml), '--folder', '2', '--output', str(output),
+                   '--text-cache', str(cache_file)])
+        with pytest.raises(KeyboardInterrupt):
+            cli.run()
+
+        assert len(json.loads(cache_file.read())['entries']) == 2
@@ -300,6 +300,47 @@ class TestDiaro(object):
         assert len(entries) == 2
         assert entries[0].title == 'Quote'
 
+    def test_get_attachments_for_entry(self):
+        xml = dedent("""\
+            <data version="2">
+            <table name="diaro_attachments">
+            <r>
+               <uid>3</uid>
+               <entry_uid>1</entry_uid>
+               <type>photo</type>
+               <filename>photo2.jpg</filename>
+               <position>2</position>
+            </r>
+            <r>
+               <uid>2</uid>
+               <entry_uid>1</entry_uid>
+               <type>photo</type>
+               <filename>photo1.jpg</filename>
+               <position>1</position>
+            </r>
+            <r>
+               <uid>4</uid>
+               <entry_uid>5</entry_uid>
+               <type>photo</type>
+               <filename>photo3.jpg</filename>
+               <position>1</position>
+            </r>
+            </table>
+            </data>
+            """)
+
+        with NamedTemporaryFile(mode='w') as fp:
+            fp.write(xml)
+            fp.flush()
+            diaro = Diaro(filename=fp.name)
+
+        attachments = diaro.get_attachments_for_entry('1')
+        assert [attachment.filename for attachment in attachments] == [
+            'photo1.jpg', 'photo2.jpg',
+        ]
+        assert len(diaro.get_attachments_for_entry('5')) == 1
+        assert diaro.get_attachments_for_entry('6') == []
+
     def get_attachments_for_entry(self, entry_uid):
         xml = dedent("""\
             <data version="2">
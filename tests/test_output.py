@@ -0,0 +1,178 @@
+"""
+Write rendered output in resumable partitions - tests
+
+Copyright (C) 2017, 2019
+Authors:
+  Tim Waugh <tim@cyberelk.net>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+
+from diaro_render.data import DiaroAttachment, DiaroEntry, DiaroFolder
+from diaro_render.output import (Checkpoint, Progress, partition,
+                                 partition_digest, write_atomic)
+from datetime import timedelta
+import os
+import pytest
+
+
+class DummyDiaro(object):
+    def __init__(self, attachments=None):
+        self.folders = {'2': DiaroFolder(uid='2', title='Diary entries',
+                                         color='#000000', pattern='')}
+        self.attachments = attachments or []
+
+    def get_attachments_for_entry(self, entry_uid):
+        return [attachment for attachment in self.attachments
+                if attachment.entry_uid == entry_uid]
+
+
+def make_entry(uid, **kwargs):
+    props = {'uid': uid, 'date': 1434997052007, 'title': 'title',
+             'text': 'text', 'folder_uid': '2'}
+    props.update(kwargs)
+    return DiaroEntry(**props)
+
+
+def test_write_atomic(tmpdir):
+    filename = str(tmpdir.join('out.html'))
+    write_atomic(filename, 'one')
+    write_atomic(filename, 'caf\xe9 \u2615')
+    assert tmpdir.join('out.html').read_binary() == \
+        'caf\xe9 \u2615'.encode('utf-8')
+    assert os.listdir(str(tmpdir)) == ['out.html']
+    umask = os.umask(0)
+    os.umask(umask)
+    assert os.stat(filename).st_mode & 0o777 == 0o666 & ~umask
+
+
+def test_write_atomic_failure(tmpdir):
+    filename = str(tmpdir.join('out.html'))
+    write_atomic(filename, 'one')
+    with pytest.raises(UnicodeEncodeError):
+        # A lone surrogate cannot be encoded
+        write_atomic(filename, 'two \ud800')
+
+    assert tmpdir.join('out.html').read() == 'one'
+    assert os.listdir(str(tmpdir)) == ['out.html']
+
+
+def test_partition():
+    assert partition(list(range(5)), 2) == [[0, 1], [2, 3], [4]]
+    assert partition([], 2) == []
+
+
+def test_partition_digest():
+    diaro = DummyDiaro()
+    entries = [make_entry('1'), make_entry('2')]
+    digest = partition_digest(diaro, entries)
+    assert digest == partition_digest(diaro, list(entries))
+    assert digest != partition_digest(diaro, entries[:1])
+    assert (partition_digest(diaro, [make_entry('12')]) !=
+            partition_digest(diaro, [make_entry('1'), make_entry('2')]))
+
+    for changed in [{'text': 'new'}, {'title': 'new'}, {'date': 1}]:
+        assert digest != partition_digest(
+            diaro, [make_entry('1', **changed), make_entry('2')])
+
+    diaro.folders['2'] = diaro.folders['2']._replace(title='Renamed')
+    assert digest != partition_digest(diaro, entries)
+
+    diaro = DummyDiaro(attachments=[
+        DiaroAttachment(uid='3', entry_uid='1', type='photo',
+                        filename='photo.jpg', position='1'),
+    ])
+    assert digest != partition_digest(diaro, entries)
+
+
+class TestCheckpoint(object):
+    def test_resume(self, tmpdir):
+        directory = str(tmpdir)
+        checkpoint = Checkpoint(directory, settings={'mediapath': ''})
+        tmpdir.join('a.html').write('')
+        checkpoint.mark_done('a.html', 'digest-a')
+        checkpoint.mark_done('b.html', 'digest-b')
+
+        checkpoint = Checkpoint(directory, settings={'mediapath': ''})
+        checkpoint.load()
+        assert checkpoint.is_done('a.html', 'digest-a')
+        assert not checkpoint.is_done('a.html', 'other')
+        # Recorded, but the file is missing
+        assert not checkpoint.is_done('b.html', 'digest-b')
+
+    def test_settings_changed(self, tmpdir):
+        directory = str(tmpdir)
+        tmpdir.join('a.html').write('')
+        Checkpoint(directory, settings={'mediapath': ''}).mark_done(
+            'a.html', 'digest-a')
+
+        checkpoint = Checkpoint(directory, settings={'mediapath': 'media'})
+        checkpoint.load()
+        assert not checkpoint.is_done('a.html', 'digest-a')
+
+    @pytest.mark.parametrize('content', [
+        '{',
+        '[]',
+        '{"version": 2, "settings": {}, "partitions": []}',
+    ])
+    def test_corrupt(self, tmpdir, content):
+        tmpdir.join('checkpoint.json').write(content)
+        checkpoint = Checkpoint(str(tmpdir))
+        checkpoint.load()
+        assert checkpoint.partitions == {}
+
+    def test_prune(self, tmpdir):
+        directory = str(tmpdir)
+        checkpoint = Checkpoint(directory)
+        for index in range(3):
+            name = 'entries-{:05d}.html'.format(index)
+            tmpdir.join(name).write('')
+            checkpoint.mark_done(name, 'digest')
+
+        tmpdir.join('entries-00003.html').write('')
+        tmpdir.join('other.html').write('')
+        checkpoint.prune(1)
+        assert sorted(os.listdir(directory)) == [
+            'checkpoint.json', 'entries-00000.html', 'other.html',
+        ]
+
+        checkpoint = Checkpoint(directory)
+        checkpoint.load()
+        assert list(checkpoint.partitions) == ['entries-00000.html']
+
+
+class TestProgress(object):
+    def test_rate_and_eta(self):
+        now = [100.0]
+        progress = Progress(100, clock=lambda: now[0])
+        assert progress.eta is None
+        assert 'ETA unknown' in str(progress)
+
+        progress.skip(50)
+        now[0] += 5
+        progress.update(10)
+        assert progress.rate == 2.0
+        assert progress.eta == timedelta(seconds=20)
+        assert str(progress) == '60/100 entries, 2.0 entries/s, ETA 0:00:20'
+
+    def test_skip_time_excluded(self):
+        now = [100.0]
+        progress = Progress(100, clock=lambda: now[0])
+        now[0] += 30
+        progress.skip(90)
+        now[0] += 2
+        progress.update(4)
+        assert progress.rate == 2.0
+        assert progress.eta == timedelta(seconds=3)
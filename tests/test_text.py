@@ -0,0 +1,133 @@
+"""
+Convert Diaro entry text into HTML - tests
+
+Copyright (C) 2017, 2019
+Authors:
+  Tim Waugh <tim@cyberelk.net>
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+
+from diaro_render.text import TextRenderer, text_hash
+import json
+import pytest
+
+
+class DummyEntry(object):
+    def __init__(self, text):
+        self.text = text
+
+
+class TestTextRenderer(object):
+    @pytest.mark.parametrize(('text', 'html'), [
+        ('', ''),
+        ('text', '<p>text</p>'),
+        ('a < b & c', '<p>a &lt; b &amp; c</p>'),
+        ('one\ntwo', '<p>one<br />\ntwo</p>'),
+        ('one\r\n\r\ntwo', '<p>one</p>\n<p>two</p>'),
+        ('one\n  \n\ntwo\n', '<p>one</p>\n<p>two</p>'),
+        ('see https://example.com/a?b=1&c=2.',
+         '<p>see <a href="https://example.com/a?b=1&amp;c=2">'
+         'https://example.com/a?b=1&amp;c=2</a>.</p>'),
+        ('(www.example.com)',
+         '<p>(<a href="http://www.example.com">www.example.com</a>)</p>'),
+        ('<http://example.com>',
+         '<p>&lt;<a href="http://example.com">http://example.com</a>&gt;</p>'),
+    ])
+    def test_convert(self, text, html):
+        assert TextRenderer.convert(text) == html
+
+    def test_render_entries(self):
+        renderer = TextRenderer()
+        entries = [DummyEntry(str(n)) for n in range(5)] + [DummyEntry('0')]
+        rendered = list(renderer.render_entries(entries))
+        assert [entry for entry, html in rendered] == entries
+        assert [html for entry, html in rendered] == [
+            '<p>0</p>', '<p>1</p>', '<p>2</p>', '<p>3</p>', '<p>4</p>',
+            '<p>0</p>',
+        ]
+        assert len(renderer.cache) == 5
+
+    def test_cache_file(self, tmpdir):
+        cache_file = str(tmpdir.join('cache.json'))
+        renderer = TextRenderer(cache_file=cache_file)
+        assert renderer.render('a & b') == '<p>a &amp; b</p>'
+        renderer.save()
+
+        with open(cache_file) as fp:
+            data = json.load(fp)
+
+        assert data['entries'] == {text_hash('a & b'): '<p>a &amp; b</p>'}
+
+        # Results are reused from the cache on the next run
+        data['entries'][text_hash('a & b')] = 'cached'
+        with open(cache_file, 'w') as fp:
+            json.dump(data, fp)
+
+        renderer = TextRenderer(cache_file=cache_file)
+        assert renderer.render('a & b') == 'cached'
+        assert not renderer.dirty
+
+    def test_cache_file_wrong_version(self, tmpdir):
+        cache_file = tmpdir.join('cache.json')
+        cache_file.write(json.dumps({'version': -1,
+                                     'entries': {text_hash('a'): 'stale'}}))
+        renderer = TextRenderer(cache_file=str(cache_file))
+        assert renderer.render('a') == '<p>a</p>'
+
+    def test_cache_file_corrupt(self, tmpdir):
+        cache_file = tmpdir.join('cache.json')
+        cache_file.write('{')
+        renderer = TextRenderer(cache_file=str(cache_file))
+        assert renderer.render('a') == '<p>a</p>'
+
+    def test_cache_file_bad_values(self, tmpdir):
+        cache_file = tmpdir.join('cache.json')
+        cache_file.write(json.dumps({'version': 1, 'entries': {
+            text_hash('a'): None,
+            text_hash('b'): 123,
+            text_hash('c'): 'cached',
+        }}))
+        renderer = TextRenderer(cache_file=str(cache_file))
+        assert renderer.render('a') == '<p>a</p>'
+        assert renderer.render('b') == '<p>b</p>'
+        assert renderer.render('c') == 'cached'
+
+    def test_prune(self, tmpdir):
+        cache_file = str(tmpdir.join('cache.json'))
+        renderer = TextRenderer(cache_file=cache_file)
+        renderer.render('old')
+        renderer.render('kept')
+        renderer.save()
+
+        renderer = TextRenderer(cache_file=cache_file)
+        renderer.prune(['kept', 'new'])
+        assert renderer.dirty
+        renderer.save()
+
+        with open(cache_file) as fp:
+            data = json.load(fp)
+
+        assert list(data['entries']) == [text_hash('kept')]
+
+    @pytest.mark.parametrize('content', [
+        '[]',
+        '{"version": 1, "entries": []}',
+    ])
+    def test_cache_file_wrong_type(self, tmpdir, content):
+        cache_file = tmpdir.join('cache.json')
+        cache_file.write(content)
+        renderer = TextRenderer(cache_file=str(cache_file))
+        assert renderer.render('a') == '<p>a</p>'